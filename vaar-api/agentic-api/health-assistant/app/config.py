@@ -1,3 +1,4 @@
+from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings
 from typing import List
 import os
@@ -13,6 +14,26 @@ class Settings(BaseSettings):
     temperature: float = 0.7
     max_tokens: int = 1000
     
+    # Embedding Backend (must match the backend used by ingestion)
+    embedding_backend: str = "openai"  # "openai", "sentence-transformers", "onnx" or "hashing"
+    local_embedding_model_path: str = ""  # Model directory for local backends
+    embedding_batch_size: int = 64
+    embedding_cache_size: int = 10000
+    
+    # Query Embedding Cache (in-process LRU + memory-mapped float16 file, shards synced to S3)
+    # S3 sync needs s3:PutObject and s3:DeleteObject on <bucket>/<query_cache_s3_key>/*
+    query_cache_enabled: bool = True
+    query_cache_dir: str = "/tmp/query_embedding_cache"
+    query_cache_s3_key: str = "query_embedding_cache"  # Empty string disables S3 sync
+    query_cache_capacity: int = 20000
+    query_cache_memory_entries: int = 2048
+    query_cache_upload_batch: int = 10  # New entries per uploaded S3 shard
+    query_cache_preload_shards: int = 32  # Newest shards fetched at startup
+    query_cache_preload_timeout: float = 2.0  # Seconds; objects not fetched by then are skipped
+    query_cache_compact_shards: int = 16  # Replace shards with one snapshot past this count
+    query_cache_snapshot_entries: int = 5000
+    query_cache_s3_timeout: float = 2.0  # Connect/read timeout for cache S3 calls
+    
     # AWS Configuration (optional for local development)
     # AWS_REGION is automatically provided by Lambda, fallback to env or default
     aws_region: str = os.environ.get("AWS_REGION", os.environ.get("AWS_DEFAULT_REGION", "us-east-1"))
@@ -28,6 +49,18 @@ class Settings(BaseSettings):
     chunk_size: int = 1000
     chunk_overlap: int = 200
     top_k_results: int = 4
+    retrieval_mode: str = "mmr"  # "mmr" or "similarity"
+    mmr_fetch_k: int = 20  # Candidates pulled from FAISS before MMR re-ranking
+    mmr_lambda: float = Field(0.5, ge=0.0, le=1.0)  # 1.0 = pure relevance, 0.0 = pure diversity
+    
+    @field_validator("retrieval_mode")
+    @classmethod
+    def validate_retrieval_mode(cls, value: str) -> str:
+        """Normalize the retrieval mode and reject unknown values."""
+        mode = value.strip().lower()
+        if mode not in ("mmr", "similarity"):
+            raise ValueError(f"Unknown retrieval mode '{value}'. Expected 'mmr' or 'similarity'")
+        return mode
     
     @property
     def cors_origins_list(self) -> List[str]:
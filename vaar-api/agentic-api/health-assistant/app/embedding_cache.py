@@ -0,0 +1,357 @@
+import io
+import os
+import re
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+KEYS_FILE = "keys.npy"
+VECTORS_FILE = "vectors.npy"
+SHARDS_PREFIX = "shards"
+SNAPSHOTS_PREFIX = "snapshots"
+
+
+def normalize_question(text: str) -> str:
+    """Normalize a question so trivially different spellings share a cache entry."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def model_namespace(model_id: str) -> str:
+    """Short, path-safe hash of the embedding model id."""
+    return hashlib.blake2b(model_id.encode("utf-8"), digest_size=6).hexdigest()
+
+
+class QueryEmbeddingCache(Embeddings):
+    """
+    Two-tier cache for query embeddings in front of an embedding backend.
+
+    Tier 1 is an in-process LRU of float32 vectors. Tier 2 is a pair of
+    memory-mapped .npy files used as a ring buffer: a (capacity, 2) uint64
+    array of [key, sequence] rows (the hash index; sequence 0 marks an empty
+    slot) and a float16 vector matrix with one row per key. The sequence
+    numbers let a restarted process find the oldest row to overwrite next.
+
+    Local files and S3 objects live under a hash of model_id, so caches of
+    different embedding models never mix.
+
+    With an S3 client configured:
+      - flush() uploads new entries as a small shard once upload_batch of them
+        have accumulated. The upload is synchronous, so the client should use
+        short timeouts. Entries still below the batch size are lost if the
+        container is recycled.
+      - preload() runs once per process. It reads the newest snapshot plus
+        at most preload_shards newer shards, fetched in parallel and abandoned
+        after preload_timeout seconds.
+      - When more than compact_shards shards are newer than the snapshot,
+        preload() writes a new snapshot (the newest snapshot_entries entries)
+        from a background thread and then deletes the shards it covers. The
+        snapshot key is derived from the newest shard it covers, so containers
+        compacting at the same time overwrite one object rather than piling up
+        copies. If the container is frozen first, compaction simply happens on
+        a later cold start.
+
+    Document embeddings pass straight through to the backend.
+    """
+
+    def __init__(
+        self,
+        backend: Embeddings,
+        model_id: str,
+        cache_dir: str,
+        capacity: int = 20000,
+        memory_entries: int = 2048,
+        upload_batch: int = 10,
+        preload_shards: int = 32,
+        preload_timeout: float = 2.0,
+        compact_shards: int = 16,
+        snapshot_entries: int = 5000,
+        s3_client=None,
+        s3_bucket: Optional[str] = None,
+        s3_prefix: Optional[str] = None
+    ):
+        namespace = model_namespace(model_id)
+        self.backend = backend
+        self.model_id = model_id
+        self.cache_dir = os.path.join(cache_dir, namespace)
+        self.capacity = capacity
+        self.memory_entries = memory_entries
+        self.upload_batch = upload_batch
+        self.preload_shards = preload_shards
+        self.preload_timeout = preload_timeout
+        self.compact_shards = compact_shards
+        self.snapshot_entries = snapshot_entries
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket
+        self.s3_prefix = f"{s3_prefix}/{namespace}" if s3_prefix else None
+
+        self._memory: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._keys: Optional[np.ndarray] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._rows: dict = {}
+        self._cursor = 0
+        self._sequence = 0
+        self._unflushed: List[int] = []
+        self._preloaded = False
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return getattr(self.backend, "dimension", None)
+
+    def _key(self, text: str) -> int:
+        """Hash the normalized question and model into a non-zero uint64 key."""
+        payload = f"{self.model_id}\n{normalize_question(text)}".encode("utf-8")
+        key = int.from_bytes(hashlib.blake2b(payload, digest_size=8).digest(), "little")
+        return key or 1
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    @property
+    def _s3_enabled(self) -> bool:
+        return bool(self.s3_client and self.s3_bucket and self.s3_prefix)
+
+    def preload(self):
+        """
+        Open the local files and merge recent S3 entries into them.
+
+        Runs once per process; later calls (e.g. Mangum running the ASGI
+        lifespan around every invocation) return immediately.
+        """
+        if self._preloaded:
+            return
+        self._preloaded = True
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._open_local_files()
+        if self._s3_enabled:
+            self._merge_from_s3()
+
+    def _open_local_files(self):
+        if not (os.path.exists(self._path(KEYS_FILE)) and os.path.exists(self._path(VECTORS_FILE))):
+            logger.info("Starting with an empty local query embedding cache")
+            return
+
+        try:
+            keys = np.load(self._path(KEYS_FILE), mmap_mode="r+")
+            vectors = np.load(self._path(VECTORS_FILE), mmap_mode="r+")
+            if keys.shape != (self.capacity, 2) or vectors.shape[0] != self.capacity:
+                logger.warning("Query embedding cache layout changed, discarding local cache")
+                return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Query embedding cache unreadable, discarding it: {e}")
+            return
+
+        self._keys, self._vectors = keys, vectors
+        filled = np.flatnonzero(keys[:, 1])
+        self._rows = {int(keys[row, 0]): int(row) for row in filled}
+        if filled.size:
+            newest = int(filled[np.argmax(keys[filled, 1])])
+            self._sequence = int(keys[newest, 1])
+            self._cursor = (newest + 1) % self.capacity
+        logger.info(f"Preloaded {len(self._rows)} cached query embeddings from {self.cache_dir}")
+
+    def _list_objects(self, folder: str) -> List[str]:
+        """Object keys under <prefix>/<folder>/, sorted oldest first (names start with a timestamp)."""
+        keys = []
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.s3_bucket, Prefix=f"{self.s3_prefix}/{folder}/"):
+            keys.extend(item["Key"] for item in page.get("Contents", []))
+        return sorted(keys)
+
+    def _merge_from_s3(self):
+        """Add the newest snapshot and recent shards without dropping local entries."""
+        try:
+            snapshots = self._list_objects(SNAPSHOTS_PREFIX)
+            shards = self._list_objects(SHARDS_PREFIX)
+        except Exception as e:
+            logger.warning(f"Failed to list query embedding cache objects in S3: {e}")
+            return
+
+        snapshot = snapshots[-1] if snapshots else None
+        snapshot_stem = os.path.basename(snapshot) if snapshot else ""
+        newer_shards = [key for key in shards if os.path.basename(key) > snapshot_stem]
+        objects = ([snapshot] if snapshot else []) + newer_shards[-self.preload_shards:]
+        if not objects:
+            return
+
+        executor = ThreadPoolExecutor(max_workers=min(8, len(objects)))
+        futures = {executor.submit(self._get_entries, key): key for key in objects}
+        done, not_done = wait(futures, timeout=self.preload_timeout)
+        executor.shutdown(wait=False, cancel_futures=True)
+        if not_done:
+            logger.warning(
+                f"Skipped {len(not_done)} query embedding cache objects "
+                f"after the {self.preload_timeout}s preload budget"
+            )
+
+        # Merge oldest first so the newest entries survive if the ring overflows
+        added = 0
+        merged = set()
+        for future in sorted(done, key=lambda future: os.path.basename(futures[future])):
+            entries = future.result()
+            if entries is None:
+                continue
+            merged.add(futures[future])
+            for key, vector in zip(*entries):
+                if int(key) not in self._rows and self._store(int(key), vector, from_shard=True):
+                    added += 1
+        logger.info(f"Merged {added} query embeddings from {len(merged)} S3 objects")
+
+        # Never compact away a snapshot we could not read
+        if len(newer_shards) > self.compact_shards and (snapshot is None or snapshot in merged):
+            self._start_snapshot(newer_shards, snapshots)
+
+    def _get_entries(self, key: str):
+        try:
+            body = self.s3_client.get_object(Bucket=self.s3_bucket, Key=key)["Body"].read()
+            with np.load(io.BytesIO(body)) as data:
+                return data["keys"], data["vectors"]
+        except Exception as e:
+            logger.warning(f"Skipping unreadable query embedding cache object {key}: {e}")
+            return None
+
+    def _start_snapshot(self, covered_shards: List[str], old_snapshots: List[str]):
+        """
+        Upload a snapshot of the newest entries in the background, then delete
+        the shards and snapshots it replaces.
+
+        Entries from shards that missed the preload budget are dropped here;
+        this only loses cache entries.
+        """
+        order = self._age_order()[-self.snapshot_entries:]
+        if order.size == 0:
+            return
+        # Copy now so the upload thread never reads rows that requests are writing
+        keys = self._keys[order, 0].copy()
+        vectors = np.array(self._vectors[order])
+        snapshot_key = f"{self.s3_prefix}/{SNAPSHOTS_PREFIX}/{os.path.basename(covered_shards[-1])}"
+
+        def upload():
+            if not self._put_object(snapshot_key, keys, vectors):
+                return
+            for key in covered_shards + [old for old in old_snapshots if old != snapshot_key]:
+                try:
+                    self.s3_client.delete_object(Bucket=self.s3_bucket, Key=key)
+                except Exception as e:
+                    logger.warning(f"Failed to delete compacted query embedding cache object {key}: {e}")
+            logger.info(f"Compacted {len(covered_shards)} query embedding cache shards into {snapshot_key}")
+
+        threading.Thread(target=upload, daemon=True).start()
+
+    def _age_order(self) -> np.ndarray:
+        """Filled rows, oldest first."""
+        if self._keys is None:
+            return np.empty(0, dtype=np.intp)
+        filled = np.flatnonzero(self._keys[:, 1])
+        return filled[np.argsort(self._keys[filled, 1])]
+
+    def _open_files(self, dimension: int):
+        """Create empty memory-mapped files once the vector size is known."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._keys = np.lib.format.open_memmap(
+            self._path(KEYS_FILE), mode="w+", dtype=np.uint64, shape=(self.capacity, 2)
+        )
+        self._vectors = np.lib.format.open_memmap(
+            self._path(VECTORS_FILE), mode="w+", dtype=np.float16, shape=(self.capacity, dimension)
+        )
+        self._rows = {}
+        self._cursor = 0
+        self._sequence = 0
+        self._unflushed = []
+
+    def _remember(self, key: int, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _store(self, key: int, vector: np.ndarray, from_shard: bool = False) -> bool:
+        """Write one entry into the ring buffer, overwriting the oldest row."""
+        if self._vectors is None:
+            self._open_files(vector.shape[0])
+        elif self._vectors.shape[1] != vector.shape[0]:
+            if from_shard:
+                # Same model id but a different vector size; ignore the stale object
+                return False
+            logger.warning("Embedding size changed, discarding local query embedding cache")
+            self._open_files(vector.shape[0])
+
+        row = self._cursor
+        if self._keys[row, 1]:
+            self._rows.pop(int(self._keys[row, 0]), None)
+        self._sequence += 1
+        self._keys[row] = (key, self._sequence)
+        self._vectors[row] = vector.astype(np.float16)
+        self._rows[key] = row
+        self._cursor = (row + 1) % self.capacity
+        return True
+
+    def flush(self, force: bool = False):
+        """
+        Sync the local files and upload new entries as one shard.
+
+        Nothing is uploaded until upload_batch new entries are waiting,
+        unless force is set.
+        """
+        if self._keys is None or not self._unflushed:
+            return
+        self._keys.flush()
+        self._vectors.flush()
+        if not self._s3_enabled or (len(self._unflushed) < self.upload_batch and not force):
+            return
+
+        keys = [key for key in self._unflushed if key in self._rows]
+        self._unflushed = []
+        if not keys:
+            return
+
+        rows = [self._rows[key] for key in keys]
+        shard_key = f"{self.s3_prefix}/{SHARDS_PREFIX}/{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.npz"
+        self._put_object(shard_key, np.asarray(keys, dtype=np.uint64), np.asarray(self._vectors[rows]))
+
+    def _put_object(self, key: str, keys: np.ndarray, vectors: np.ndarray) -> bool:
+        buffer = io.BytesIO()
+        np.savez(buffer, keys=keys, vectors=vectors)
+        try:
+            self.s3_client.put_object(Bucket=self.s3_bucket, Key=key, Body=buffer.getvalue())
+            logger.info(f"Uploaded {len(keys)} query embeddings to s3://{self.s3_bucket}/{key}")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to upload query embedding cache object {key}: {e}")
+            return False
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+            return vector.tolist()
+
+        row = self._rows.get(key)
+        if row is not None:
+            vector = np.asarray(self._vectors[row], dtype=np.float32)
+            self._remember(key, vector)
+            return vector.tolist()
+
+        vector = np.asarray(self.backend.embed_query(text), dtype=np.float32)
+        self._remember(key, vector)
+        try:
+            if self._store(key, vector):
+                self._unflushed.append(key)
+        except OSError as e:
+            logger.warning(f"Failed to persist query embedding: {e}")
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.backend.embed_documents(texts)
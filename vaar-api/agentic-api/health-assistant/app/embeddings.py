@@ -0,0 +1,244 @@
+import re
+import hashlib
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Backends accepted by build_embeddings / EMBEDDING_BACKEND
+EMBEDDING_BACKENDS = ("openai", "sentence-transformers", "onnx", "hashing")
+
+# Default vector sizes of the OpenAI embedding models
+OPENAI_EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic feature-hashing embedder.
+
+    Needs no model files or network access, so it is meant for offline tests
+    and local runs; the vectors carry lexical overlap only.
+    """
+
+    def __init__(self, dimension: int = 1536):
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """Local CPU embeddings from a sentence-transformers model directory."""
+
+    def __init__(self, model_path: str, batch_size: int = 64):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError(
+                "sentence-transformers is required for EMBEDDING_BACKEND=sentence-transformers. "
+                "Install it with: pip install sentence-transformers"
+            )
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_path, device="cpu")
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        )
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Local CPU embeddings from an exported ONNX encoder.
+
+    The model directory must contain model.onnx and a Hugging Face
+    tokenizer.json. Token embeddings are mean-pooled and L2-normalized.
+    """
+
+    def __init__(self, model_path: str, batch_size: int = 64, max_length: int = 512):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise ImportError(
+                "onnxruntime and tokenizers are required for EMBEDDING_BACKEND=onnx. "
+                "Install them with: pip install onnxruntime tokenizers"
+            )
+        model_dir = Path(model_path)
+        self.batch_size = batch_size
+        self.session = onnxruntime.InferenceSession(
+            str(model_dir / "model.onnx"),
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        hidden_size = self.session.get_outputs()[0].shape[-1]
+        self.dimension = hidden_size if isinstance(hidden_size, int) else None
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = [
+            self._embed_batch(texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        if not vectors:
+            return []
+        return np.vstack(vectors).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Per-process LRU cache of query embeddings in front of any backend.
+
+    Repeated questions are embedded once per process and kept as float32
+    arrays. Document embeddings pass straight through so each backend keeps
+    its own request batching (OpenAIEmbeddings sends up to chunk_size texts per
+    call) and ingested chunks, which are embedded only once, are not cached.
+    """
+
+    def __init__(self, backend: Embeddings, max_entries: int = 10000):
+        self.backend = backend
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return getattr(self.backend, "dimension", None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.backend.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._cache.get(text)
+        if vector is not None:
+            self._cache.move_to_end(text)
+            return vector.tolist()
+
+        vector = np.asarray(self.backend.embed_query(text), dtype=np.float32)
+        self._cache[text] = vector
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return vector.tolist()
+
+
+def embedding_dimension(embeddings: Embeddings) -> Optional[int]:
+    """
+    Report the vector size produced by an embedding backend without calling it.
+
+    Looks through cache wrappers to the backend; OpenAI models are resolved
+    from OPENAI_EMBEDDING_DIMENSIONS.
+
+    Returns:
+        Vector size, or None if it cannot be known up front
+    """
+    dimension = getattr(embeddings, "dimension", None)
+    if dimension:
+        return int(dimension)
+    backend = getattr(embeddings, "backend", None)
+    if backend is not None:
+        return embedding_dimension(backend)
+    return OPENAI_EMBEDDING_DIMENSIONS.get(getattr(embeddings, "model", None))
+
+
+def build_embeddings(
+    backend: str,
+    openai_api_key: Optional[str] = None,
+    openai_model: str = "text-embedding-3-small",
+    local_model_path: Optional[str] = None,
+    batch_size: int = 64,
+    cache_size: int = 10000,
+    hashing_dimension: int = 1536
+) -> Embeddings:
+    """
+    Create the embedding backend shared by the API and the ingestion script.
+
+    The API and DocumentIngestion must use the same backend and model, or the
+    query vectors will not live in the same space as the indexed chunks.
+
+    Args:
+        backend: One of EMBEDDING_BACKENDS
+        openai_api_key: API key for the openai backend
+        openai_model: OpenAI embedding model name
+        local_model_path: Model directory for the sentence-transformers and onnx backends
+        batch_size: Texts per forward pass for the local backends
+        cache_size: Maximum cached query vectors per process (0 disables the cache)
+        hashing_dimension: Vector size for the hashing backend
+
+    Returns:
+        Embeddings instance, wrapped in a per-process query cache unless cache_size is 0
+    """
+    backend = backend.lower()
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings(
+            model=openai_model,
+            openai_api_key=openai_api_key
+        )
+    elif backend in ("sentence-transformers", "onnx"):
+        if not local_model_path:
+            raise ValueError(f"LOCAL_EMBEDDING_MODEL_PATH is required for EMBEDDING_BACKEND={backend}")
+        if backend == "onnx":
+            embeddings = OnnxEmbeddings(local_model_path, batch_size=batch_size)
+        else:
+            embeddings = SentenceTransformerEmbeddings(local_model_path, batch_size=batch_size)
+    elif backend == "hashing":
+        embeddings = HashingEmbeddings(dimension=hashing_dimension)
+    else:
+        raise ValueError(
+            f"Unknown embedding backend '{backend}'. Expected one of: {', '.join(EMBEDDING_BACKENDS)}"
+        )
+
+    logger.info(f"Using '{backend}' embedding backend")
+    if cache_size <= 0:
+        return embeddings
+    return CachedEmbeddings(embeddings, max_entries=cache_size)
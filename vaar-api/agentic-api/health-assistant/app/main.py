@@ -18,13 +18,21 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Load vector store on startup."""
+    """
+    Load vector store and query embedding cache on startup.
+    
+    Mangum runs this lifespan around every Lambda invocation, so the query
+    cache preloads only once per container and the shutdown flush uploads
+    only when a batch of new entries is waiting.
+    """
     logger.info("Starting application.......")
+    rag_system.load_query_cache()
     success = rag_system.load_vector_store()
     if not success:
         logger.warning("Failed to load vector store on startup")
     yield
     logger.info("Shutting down application...")
+    rag_system.flush_query_cache()
 
 
 # Create FastAPI app
@@ -125,8 +133,10 @@ async def get_info():
             "vector_store_loaded": True,
             "document_count": doc_count,
             "model": settings.openai_model,
+            "embedding_backend": settings.embedding_backend,
             "embedding_model": settings.openai_embedding_model,
             "top_k_results": settings.top_k_results,
+            "retrieval_mode": settings.retrieval_mode,
             "environment": settings.environment
         }
     except Exception as e:
@@ -16,12 +16,22 @@ class QueryRequest(BaseModel):
         }
 
 
+class SourceLocation(BaseModel):
+    """Another place the same passage appears."""
+    source: str = Field(..., description="Source document name")
+    page: Optional[int] = Field(None, description="Page number if available")
+
+
 class SourceDocument(BaseModel):
     """Source document information."""
     content: str = Field(..., description="Relevant excerpt from the document")
     source: str = Field(..., description="Source document name")
     page: Optional[int] = Field(None, description="Page number if available")
     score: Optional[float] = Field(None, description="Relevance score")
+    other_locations: List[SourceLocation] = Field(
+        default_factory=list,
+        description="Other pages with a near-identical passage (merged at ingestion)"
+    )
 
 
 class QueryResponse(BaseModel):
@@ -2,15 +2,19 @@ import os
 import logging
 from typing import List, Optional
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain_openai import ChatOpenAI
 from langchain_community.vectorstores import FAISS
 from langchain.chains import ConversationalRetrievalChain
 from langchain.memory import ConversationBufferMemory
 from langchain.prompts import PromptTemplate
 
 from app.config import settings
-from app.models import SourceDocument
+from app.embeddings import build_embeddings, embedding_dimension
+from app.embedding_cache import QueryEmbeddingCache
+from app.models import SourceDocument, SourceLocation
+from app.retrieval import MMRFaissRetriever, reconstruct_candidates
 
 logger = logging.getLogger(__name__)
 
@@ -20,19 +24,77 @@ class HealthInsuranceRAG:
     
     def __init__(self):
         self.vector_store: Optional[FAISS] = None
-        self.embeddings = OpenAIEmbeddings(
-            model=settings.openai_embedding_model,
-            openai_api_key=settings.openai_api_key
+        self.mmr_supported = False
+        self.embeddings = build_embeddings(
+            backend=settings.embedding_backend,
+            openai_api_key=settings.openai_api_key,
+            openai_model=settings.openai_embedding_model,
+            local_model_path=settings.local_embedding_model_path,
+            batch_size=settings.embedding_batch_size,
+            # The persistent query cache below replaces the per-process one
+            cache_size=0 if settings.query_cache_enabled else settings.embedding_cache_size
         )
+        self.s3_client = boto3.client('s3', region_name=settings.aws_region)
+        self.query_cache: Optional[QueryEmbeddingCache] = None
+        if settings.query_cache_enabled:
+            self.query_cache = QueryEmbeddingCache(
+                backend=self.embeddings,
+                model_id=self.embedding_model_id,
+                cache_dir=settings.query_cache_dir,
+                capacity=settings.query_cache_capacity,
+                memory_entries=settings.query_cache_memory_entries,
+                upload_batch=settings.query_cache_upload_batch,
+                preload_shards=settings.query_cache_preload_shards,
+                preload_timeout=settings.query_cache_preload_timeout,
+                compact_shards=settings.query_cache_compact_shards,
+                snapshot_entries=settings.query_cache_snapshot_entries,
+                # Cache uploads happen inside invocations, so fail fast instead of retrying
+                s3_client=boto3.client(
+                    's3',
+                    region_name=settings.aws_region,
+                    config=Config(
+                        connect_timeout=settings.query_cache_s3_timeout,
+                        read_timeout=settings.query_cache_s3_timeout,
+                        retries={"max_attempts": 1}
+                    )
+                ),
+                s3_bucket=settings.s3_bucket_name,
+                s3_prefix=settings.query_cache_s3_key
+            )
+            self.embeddings = self.query_cache
         self.llm = ChatOpenAI(
             model=settings.openai_model,
             temperature=settings.temperature,
             max_tokens=settings.max_tokens,
             openai_api_key=settings.openai_api_key
         )
-        self.s3_client = boto3.client('s3', region_name=settings.aws_region)
         self.local_index_path = "/tmp/faiss_index"
         
+    @property
+    def embedding_model_id(self) -> str:
+        """Identify the embedding model so cached vectors never mix vector spaces."""
+        if settings.embedding_backend.lower() == "openai":
+            return settings.openai_embedding_model
+        return f"{settings.embedding_backend}:{settings.local_embedding_model_path}"
+    
+    def load_query_cache(self):
+        """Preload the persistent query-embedding cache (once per process)."""
+        if self.query_cache is None:
+            return
+        try:
+            self.query_cache.preload()
+        except Exception as e:
+            logger.warning(f"Failed to preload query embedding cache: {e}")
+    
+    def flush_query_cache(self):
+        """Persist new query embeddings, uploading a shard once a batch has built up."""
+        if self.query_cache is None:
+            return
+        try:
+            self.query_cache.flush()
+        except Exception as e:
+            logger.warning(f"Failed to flush query embedding cache: {e}")
+    
     def load_vector_store(self) -> bool:
         """Load FAISS vector store from local directory or S3."""
         try:
@@ -53,6 +115,8 @@ class HealthInsuranceRAG:
                         local_vector_path,
                         self.embeddings
                     )
+                self._check_embedding_dimension()
+                self._check_mmr_support()
                 logger.info("Vector store loaded successfully from local directory")
                 return True
             
@@ -95,16 +159,71 @@ class HealthInsuranceRAG:
                     self.embeddings
                 )
             
+            self._check_embedding_dimension()
+            self._check_mmr_support()
             logger.info("Vector store loaded successfully from S3")
             return True
             
         except ClientError as e:
             logger.error(f"Failed to load vector store from S3: {e}")
+            self._reset_vector_store()
             return False
         except Exception as e:
             logger.error(f"Error loading vector store: {e}")
+            self._reset_vector_store()
             return False
     
+    def _reset_vector_store(self):
+        """Leave the system unloaded after a failed load so is_loaded() stays accurate."""
+        self.vector_store = None
+        self.mmr_supported = False
+    
+    def _check_embedding_dimension(self):
+        """Refuse an index built with a different embedding backend or model."""
+        index_dimension = self.vector_store.index.d
+        query_dimension = embedding_dimension(self.embeddings)
+        if query_dimension is None:
+            logger.warning(
+                f"Cannot determine the vector size of embedding backend '{settings.embedding_backend}'; "
+                f"skipping the check against the {index_dimension}-dimensional index"
+            )
+            return
+        if query_dimension != index_dimension:
+            raise ValueError(
+                f"Embedding backend '{settings.embedding_backend}' produces {query_dimension}-dimensional "
+                f"vectors but the FAISS index has {index_dimension}. Re-run ingestion with the same "
+                "EMBEDDING_BACKEND/model as the API."
+            )
+    
+    def _check_mmr_support(self):
+        """Check that stored vectors can be read back from the index for MMR re-ranking."""
+        index = self.vector_store.index
+        try:
+            if index.ntotal > 0:
+                reconstruct_candidates(index, [0])
+            self.mmr_supported = True
+        except Exception as e:
+            self.mmr_supported = False
+            if settings.retrieval_mode == "mmr":
+                logger.warning(
+                    f"{type(index).__name__} cannot reconstruct stored vectors ({e}); "
+                    "falling back to similarity retrieval"
+                )
+    
+    def get_retriever(self):
+        """Build the retriever selected by settings.retrieval_mode."""
+        if settings.retrieval_mode == "mmr" and self.mmr_supported:
+            return MMRFaissRetriever(
+                vector_store=self.vector_store,
+                embeddings=self.embeddings,
+                k=settings.top_k_results,
+                fetch_k=settings.mmr_fetch_k,
+                lambda_mult=settings.mmr_lambda
+            )
+        return self.vector_store.as_retriever(
+            search_kwargs={"k": settings.top_k_results}
+        )
+    
     def is_loaded(self) -> bool:
         """Check if vector store is loaded."""
         return self.vector_store is not None
@@ -161,9 +280,7 @@ Provide a clear, accurate, and helpful answer. If the question is not about heal
             # Create conversational retrieval chain
             qa_chain = ConversationalRetrievalChain.from_llm(
                 llm=self.llm,
-                retriever=self.vector_store.as_retriever(
-                    search_kwargs={"k": settings.top_k_results}
-                ),
+                retriever=self.get_retriever(),
                 memory=memory,
                 return_source_documents=True,
                 combine_docs_chain_kwargs={"prompt": PROMPT}
@@ -191,11 +308,20 @@ Provide a clear, accurate, and helpful answer. If the question is not about heal
             # Only include sources if the question is on-topic
             if not is_off_topic:
                 for doc in result.get("source_documents", []):
+                    source = doc.metadata.get("source", "Unknown")
+                    page = doc.metadata.get("page", None)
+                    # Pages whose near-duplicate chunks were merged into this one at ingestion
+                    other_locations = [
+                        SourceLocation(source=location["source"], page=location.get("page"))
+                        for location in doc.metadata.get("sources", [])
+                        if (location["source"], location.get("page")) != (source, page)
+                    ]
                     source_doc = SourceDocument(
                         content=doc.page_content[:300] + "..." if len(doc.page_content) > 300 else doc.page_content,
-                        source=doc.metadata.get("source", "Unknown"),
-                        page=doc.metadata.get("page", None),
-                        score=None  # FAISS doesn't return scores by default
+                        source=source,
+                        page=page,
+                        score=None,  # FAISS doesn't return scores by default
+                        other_locations=other_locations
                     )
                     sources.append(source_doc)
             
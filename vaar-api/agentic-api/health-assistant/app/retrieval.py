@@ -0,0 +1,133 @@
+import logging
+from typing import Any, List
+
+import numpy as np
+from langchain_core.callbacks.manager import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row so dot products become cosine similarities."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def maximal_marginal_relevance(
+    query_embedding: np.ndarray,
+    candidate_embeddings: np.ndarray,
+    k: int = 4,
+    lambda_mult: float = 0.5,
+) -> List[int]:
+    """
+    Select candidates that balance relevance to the query against redundancy.
+
+    All similarities are computed up front with two matrix products; each
+    selection step then only updates a running "max similarity to anything
+    already selected" vector, so the work per step is a single row read.
+
+    Args:
+        query_embedding: Query vector of shape (dim,)
+        candidate_embeddings: Candidate vectors of shape (n, dim)
+        k: Number of candidates to select
+        lambda_mult: 1.0 ranks purely by relevance, 0.0 purely by diversity
+
+    Returns:
+        Indices into candidate_embeddings, in selection order
+    """
+    candidates = _normalize_rows(np.asarray(candidate_embeddings, dtype=np.float32))
+    if candidates.ndim != 2 or candidates.shape[0] == 0:
+        return []
+
+    k = min(k, candidates.shape[0])
+    if k <= 0:
+        return []
+
+    query = _normalize_rows(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    max_redundancy = pairwise[selected[0]].copy()
+    available = np.ones(candidates.shape[0], dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_redundancy, pairwise[best], out=max_redundancy)
+
+    return selected
+
+
+def reconstruct_candidates(index: Any, ids: np.ndarray) -> np.ndarray:
+    """
+    Read the stored vectors of the given ids back out of a FAISS index.
+
+    Only the fetch_k candidates are reconstructed, so no second copy of the
+    whole index is kept in memory.
+
+    Args:
+        index: FAISS index supporting reconstruct (e.g. IndexFlat)
+        ids: Candidate ids returned by index.search
+
+    Returns:
+        Array of shape (len(ids), index.d)
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if hasattr(index, "reconstruct_batch"):
+        return np.asarray(index.reconstruct_batch(ids), dtype=np.float32)
+    return np.vstack([index.reconstruct(int(i)) for i in ids]).astype(np.float32)
+
+
+class MMRFaissRetriever(BaseRetriever):
+    """
+    FAISS retriever that re-ranks the top fetch_k hits with MMR.
+
+    Candidate vectors are reconstructed from the embeddings already stored in
+    the FAISS index, so only the question itself is embedded per query.
+    """
+
+    vector_store: Any
+    embeddings: Embeddings
+    k: int = 4
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+
+        fetch_k = max(self.fetch_k, self.k)
+        _, ids = self.vector_store.index.search(query_vector.reshape(1, -1), fetch_k)
+        candidate_ids = ids[0][ids[0] >= 0]
+        if candidate_ids.size == 0:
+            return []
+
+        order = maximal_marginal_relevance(
+            query_vector,
+            reconstruct_candidates(self.vector_store.index, candidate_ids),
+            k=self.k,
+            lambda_mult=self.lambda_mult,
+        )
+
+        documents = []
+        for position in order:
+            docstore_id = self.vector_store.index_to_docstore_id[int(candidate_ids[position])]
+            doc = self.vector_store.docstore.search(docstore_id)
+            if isinstance(doc, Document):
+                documents.append(doc)
+            else:
+                logger.warning(f"Document {docstore_id} missing from docstore")
+        return documents
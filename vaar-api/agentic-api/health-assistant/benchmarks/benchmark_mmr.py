@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark for MMR retrieval overhead.
+
+Builds an IndexFlatL2 shaped like the production index (text-embedding-3-small,
+1536 dimensions) and times, per query:
+
+  - similarity: index.search for the top k
+  - mmr: index.search for fetch_k + reconstruct_candidates + MMR selection
+  - rerank: reconstruct_candidates + MMR selection alone
+
+The difference between the mmr and similarity medians is the latency MMR mode
+adds on top of plain top-k retrieval, checked against the sub-millisecond
+budget. Exact search itself grows linearly with ntotal.
+
+Usage:
+    python benchmarks/benchmark_mmr.py
+    python benchmarks/benchmark_mmr.py --ntotal 20000 --fetch-k 50 --k 6
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.retrieval import maximal_marginal_relevance, reconstruct_candidates  # noqa: E402
+
+
+def _time_per_query(run, queries: np.ndarray) -> np.ndarray:
+    """Run once per query and return the elapsed milliseconds of each run."""
+    timings = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        run(query)
+        timings[i] = time.perf_counter() - start
+    return timings * 1000
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark MMR retrieval overhead")
+    parser.add_argument("--ntotal", type=int, default=5000, help="Vectors in the index (default: 5000)")
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimension (default: 1536)")
+    parser.add_argument("--fetch-k", type=int, default=20, help="Candidates per query (default: 20)")
+    parser.add_argument("--k", type=int, default=4, help="Documents returned (default: 4)")
+    parser.add_argument("--lambda-mult", type=float, default=0.5, help="MMR lambda (default: 0.5)")
+    parser.add_argument("--queries", type=int, default=1000, help="Timed queries (default: 1000)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.ntotal, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = faiss.IndexFlatL2(args.dim)
+    index.add(vectors)
+
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    def similarity(query):
+        index.search(query.reshape(1, -1), args.k)
+
+    def mmr(query):
+        _, ids = index.search(query.reshape(1, -1), args.fetch_k)
+        rerank(query, ids)
+
+    def rerank(query, ids):
+        candidate_ids = ids[0][ids[0] >= 0]
+        maximal_marginal_relevance(
+            query,
+            reconstruct_candidates(index, candidate_ids),
+            k=args.k,
+            lambda_mult=args.lambda_mult
+        )
+
+    # Warm up BLAS and the index before timing
+    for query in queries[:50]:
+        similarity(query)
+        mmr(query)
+
+    candidate_ids = [index.search(query.reshape(1, -1), args.fetch_k)[1] for query in queries]
+    rerank_queries = list(zip(queries, candidate_ids))
+
+    similarity_ms = _time_per_query(similarity, queries)
+    mmr_ms = _time_per_query(mmr, queries)
+    rerank_ms = _time_per_query(lambda pair: rerank(*pair), rerank_queries)
+    overhead_ms = np.median(mmr_ms) - np.median(similarity_ms)
+
+    print(
+        f"IndexFlatL2 ntotal={args.ntotal} dim={args.dim} "
+        f"k={args.k} fetch_k={args.fetch_k} ({args.queries} queries)"
+    )
+    for label, timings in (
+        ("similarity", similarity_ms),
+        ("mmr", mmr_ms),
+        ("rerank", rerank_ms)
+    ):
+        print(
+            f"  {label:<10} mean: {timings.mean():.4f} ms  "
+            f"p50: {np.percentile(timings, 50):.4f} ms  "
+            f"p99: {np.percentile(timings, 99):.4f} ms"
+        )
+    print(f"  MMR overhead (p50 mmr - p50 similarity): {overhead_ms:.4f} ms")
+
+    if overhead_ms >= 1.0:
+        print("WARNING: MMR overhead is above 1 ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -37,6 +37,7 @@ resource "aws_lambda_function" "api" {
       CHUNK_SIZE             = "1000"
       CHUNK_OVERLAP          = "200"
       TOP_K_RESULTS          = "4"
+      QUERY_CACHE_S3_KEY     = "query_embedding_cache"
     }
   }
 
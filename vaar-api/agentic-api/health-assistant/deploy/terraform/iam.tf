@@ -42,6 +42,17 @@ resource "aws_iam_role_policy" "lambda_s3_policy" {
           aws_s3_bucket.vector_store.arn,
           "${aws_s3_bucket.vector_store.arn}/*"
         ]
+      },
+      {
+        # Query embedding cache shards written and compacted by the API
+        Effect = "Allow"
+        Action = [
+          "s3:PutObject",
+          "s3:DeleteObject"
+        ]
+        Resource = [
+          "${aws_s3_bucket.vector_store.arn}/query_embedding_cache/*"
+        ]
       }
     ]
   })
@@ -28,6 +28,30 @@ resource "aws_s3_bucket_server_side_encryption_configuration" "vector_store" {
   }
 }
 
+# Expire replaced query embedding cache objects (versioning keeps deleted shards otherwise)
+resource "aws_s3_bucket_lifecycle_configuration" "vector_store" {
+  bucket = aws_s3_bucket.vector_store.id
+
+  rule {
+    id     = "expire-query-embedding-cache-versions"
+    status = "Enabled"
+
+    filter {
+      prefix = "query_embedding_cache/"
+    }
+
+    noncurrent_version_expiration {
+      noncurrent_days = 1
+    }
+
+    expiration {
+      expired_object_delete_marker = true
+    }
+  }
+
+  depends_on = [aws_s3_bucket_versioning.vector_store]
+}
+
 # Block public access
 resource "aws_s3_bucket_public_access_block" "vector_store" {
   bucket = aws_s3_bucket.vector_store.id
@@ -0,0 +1,170 @@
+"""
+Near-duplicate chunk elimination for the ingestion pipeline.
+
+Government PDFs repeat contact blocks, disclaimers and tables on many pages.
+ChunkDeduplicator groups chunks whose word shingles overlap heavily with an
+earlier chunk (MinHash signatures bucketed with LSH banding), keeps that
+earlier chunk and records every source/page the group was found on.
+"""
+
+import re
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Largest prime below 2**32; keeps (a * x + b) inside uint64 without overflow
+_HASH_PRIME = np.uint64(4294967291)
+
+
+class ChunkDeduplicator:
+    """Collapse near-duplicate document chunks using MinHash/LSH."""
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_size: int = 5,
+        seed: int = 42
+    ):
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_HASH_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_HASH_PRIME), size=num_perm, dtype=np.uint64)
+
+    def _shingles(self, text: str) -> np.ndarray:
+        """Hash the word n-grams of a chunk to 32-bit integers."""
+        words = re.findall(r"\w+", text.lower())
+        if not words:
+            return np.empty(0, dtype=np.uint64)
+        size = min(self.shingle_size, len(words))
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        return np.fromiter(
+            (
+                int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+                for s in shingles
+            ),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """
+        Compute the MinHash signature of a chunk.
+
+        Args:
+            text: Chunk text
+
+        Returns:
+            Array of num_perm minimum hash values, or None for chunks with no words
+        """
+        shingles = self._shingles(text)
+        if shingles.size == 0:
+            return None
+        hashed = (self._a[:, None] * shingles[None, :] + self._b[:, None]) % _HASH_PRIME
+        return hashed.min(axis=1)
+
+    def _clusters(self, signatures: List[Optional[np.ndarray]]) -> List[List[int]]:
+        """
+        Group chunk indices by leader clustering.
+
+        Chunks are visited in order; the first chunk of a cluster is its leader
+        and only leaders are indexed in the LSH buckets. A chunk joins the most
+        similar leader it collides with if the estimated Jaccard similarity to
+        that leader passes the threshold, otherwise it starts a new cluster.
+        Every dropped chunk is therefore within the threshold of the chunk kept
+        in its place, with no transitive chaining.
+        """
+        buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(self.bands)]
+        clusters: Dict[int, List[int]] = {}
+
+        for i, sig in enumerate(signatures):
+            if sig is None:
+                clusters[i] = [i]
+                continue
+
+            band_keys = [
+                sig[band * self.rows:(band + 1) * self.rows].tobytes()
+                for band in range(self.bands)
+            ]
+            candidates = {
+                leader
+                for band, key in enumerate(band_keys)
+                for leader in buckets[band].get(key, ())
+            }
+
+            best_leader, best_similarity = None, self.threshold
+            for leader in sorted(candidates):
+                similarity = np.mean(signatures[leader] == sig)
+                if similarity >= best_similarity:
+                    best_leader, best_similarity = leader, similarity
+
+            if best_leader is not None:
+                clusters[best_leader].append(i)
+                continue
+
+            clusters[i] = [i]
+            for band, key in enumerate(band_keys):
+                buckets[band][key].append(i)
+
+        return sorted(clusters.values(), key=lambda members: members[0])
+
+    def deduplicate(self, chunks: List) -> Tuple[List, Dict[str, float]]:
+        """
+        Keep one representative chunk per near-duplicate cluster.
+
+        The representative's metadata gains a "sources" list with the
+        source/page of every chunk in its cluster.
+
+        Args:
+            chunks: List of document chunks
+
+        Returns:
+            Tuple of (deduplicated chunks, stats dict)
+        """
+        logger.info("Detecting near-duplicate chunks...")
+
+        signatures = [self.signature(chunk.page_content) for chunk in chunks]
+        clusters = self._clusters(signatures)
+
+        kept = []
+        for members in clusters:
+            representative = chunks[members[0]]
+            sources = []
+            for i in members:
+                location = {
+                    "source": chunks[i].metadata.get("source", "Unknown"),
+                    "page": chunks[i].metadata.get("page")
+                }
+                if location not in sources:
+                    sources.append(location)
+            representative.metadata["sources"] = sources
+            kept.append(representative)
+
+        removed = len(chunks) - len(kept)
+        stats = {
+            "chunks_before": len(chunks),
+            "chunks_after": len(kept),
+            "chunks_removed": removed,
+            "reduction_pct": 100.0 * removed / len(chunks) if chunks else 0.0,
+            "duplicate_clusters": sum(1 for members in clusters if len(members) > 1)
+        }
+        logger.info(
+            f"Removed {removed} near-duplicate chunks "
+            f"({stats['chunks_before']} -> {stats['chunks_after']}, "
+            f"{stats['reduction_pct']:.1f}% reduction, "
+            f"{stats['duplicate_clusters']} duplicate clusters)"
+        )
+        return kept, stats
@@ -18,11 +18,16 @@ from typing import List
 import boto3
 from dotenv import load_dotenv
 
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.vectorstores import FAISS
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+# Make the app package importable when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.embeddings import build_embeddings  # noqa: E402
+from ingestion.dedup import ChunkDeduplicator  # noqa: E402
+
 # Load environment variables
 load_dotenv()
 
@@ -45,17 +50,27 @@ class DocumentIngestion:
         self.chunk_size = int(os.getenv("CHUNK_SIZE", "1000"))
         self.chunk_overlap = int(os.getenv("CHUNK_OVERLAP", "200"))
         self.embedding_model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+        self.embedding_backend = os.getenv("EMBEDDING_BACKEND", "openai").lower()
+        self.local_embedding_model_path = os.getenv("LOCAL_EMBEDDING_MODEL_PATH")
+        self.embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+        self.embedding_cache_size = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+        self.dedup_enabled = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+        self.dedup_threshold = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
         
         # Validate required environment variables
-        if not self.openai_api_key:
+        if self.embedding_backend == "openai" and not self.openai_api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
         if not self.s3_bucket_name:
             raise ValueError("S3_BUCKET_NAME not found in environment variables")
         
-        # Initialize embeddings
-        self.embeddings = OpenAIEmbeddings(
-            model=self.embedding_model,
-            openai_api_key=self.openai_api_key
+        # Initialize embeddings (same backend as the API so the vector spaces match)
+        self.embeddings = build_embeddings(
+            backend=self.embedding_backend,
+            openai_api_key=self.openai_api_key,
+            openai_model=self.embedding_model,
+            local_model_path=self.local_embedding_model_path,
+            batch_size=self.embedding_batch_size,
+            cache_size=self.embedding_cache_size
         )
         
         # Initialize S3 client
@@ -128,6 +143,20 @@ class DocumentIngestion:
         
         return chunks
     
+    def deduplicate_chunks(self, chunks: List) -> List:
+        """
+        Drop near-duplicate chunks (repeated boilerplate) before embedding.
+        
+        Args:
+            chunks: List of document chunks
+            
+        Returns:
+            List of chunks with one representative per near-duplicate cluster
+        """
+        deduplicator = ChunkDeduplicator(threshold=self.dedup_threshold)
+        unique_chunks, _ = deduplicator.deduplicate(chunks)
+        return unique_chunks
+    
     def create_vector_store(self, chunks: List) -> FAISS:
         """
         Create FAISS vector store from document chunks.
@@ -232,13 +261,20 @@ class DocumentIngestion:
             # Step 2: Split documents
             chunks = self.split_documents(documents)
             
-            # Step 3: Create vector store
-            vector_store = self.create_vector_store(chunks)
+            # Step 3: Remove near-duplicate chunks
+            if self.dedup_enabled:
+                unique_chunks = self.deduplicate_chunks(chunks)
+            else:
+                logger.info("Skipping near-duplicate detection (DEDUP_ENABLED=false)")
+                unique_chunks = chunks
+            
+            # Step 4: Create vector store
+            vector_store = self.create_vector_store(unique_chunks)
             
-            # Step 4: Save locally
+            # Step 5: Save locally
             self.save_vector_store_locally(vector_store)
             
-            # Step 5: Upload to S3
+            # Step 6: Upload to S3
             if not skip_upload:
                 self.upload_to_s3()
             else:
@@ -249,6 +285,7 @@ class DocumentIngestion:
             logger.info("=" * 60)
             logger.info(f"Total documents processed: {len(documents)}")
             logger.info(f"Total chunks created: {len(chunks)}")
+            logger.info(f"Unique chunks embedded: {len(unique_chunks)}")
             logger.info(f"Vector store size: {vector_store.index.ntotal}")
             if not skip_upload:
                 logger.info(f"S3 location: s3://{self.s3_bucket_name}/{self.vector_index_key}/")